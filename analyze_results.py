@@ -9,6 +9,7 @@ from __future__ import annotations
 
 import argparse
 import csv
+import sys
 from collections import defaultdict
 
 def main() -> None:
@@ -16,37 +17,46 @@ def main() -> None:
     ap.add_argument("--in", dest="inp", default="results/pilot_results.csv")
     args = ap.parse_args()
 
-    # Keep only final attempt per task (first PASS or last attempt)
+    # Keep only final attempt per task (first PASS or last attempt), reduced while reading.
+    # Values are (attempt, passed, task_type, error).
     per_task = {}
-    attempts = defaultdict(list)
-
-    with open(args.inp, "r", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            row["attempt"] = int(row["attempt"])
-            row["passed"] = row["passed"].lower() == "true"
-            attempts[row["task_id"]].append(row)
-
-    for tid, rows in attempts.items():
-        rows_sorted = sorted(rows, key=lambda x: x["attempt"])
-        final = None
-        for rr in rows_sorted:
-            final = rr
-            if rr["passed"]:
-                break
-        per_task[tid] = final
+
+    with open(args.inp, "r", encoding="utf-8", newline="") as f:
+        r = csv.reader(f)
+        header = next(r, [])
+        idx = {name: i for i, name in enumerate(header)}
+        if header:
+            TID, TYPE, ATT, PAS, ERR = (idx[k] for k in ("task_id", "task_type", "attempt", "passed", "error"))
+        # An empty file has no header and no rows; the summary below is then empty
+        for row in (r if header else ()):
+            if not row:
+                continue
+            tid = row[TID]
+            attempt = int(row[ATT])
+            passed = row[PAS].lower() == "true"
+            cur = per_task.get(tid)
+            if cur is None:
+                keep = True
+            elif passed:
+                # Earliest PASS wins
+                keep = not cur[1] or attempt < cur[0]
+            else:
+                keep = not cur[1] and attempt >= cur[0]
+            if keep:
+                # Task types and error codes repeat across tasks; intern so kept rows
+                # share one string each and the summary dicts below hit on identity.
+                per_task[tid] = (attempt, passed, sys.intern(row[TYPE]), sys.intern(row[ERR]))
 
     # Summaries
     by_type = defaultdict(lambda: {"n":0, "pass":0})
     err_counts = defaultdict(int)
 
-    for tid, row in per_task.items():
-        ttype = row["task_type"]
+    for _attempt, passed, ttype, error in per_task.values():
         by_type[ttype]["n"] += 1
-        if row["passed"]:
+        if passed:
             by_type[ttype]["pass"] += 1
         else:
-            err_counts[row["error"]] += 1
+            err_counts[error] += 1
 
     print("Final pass rates (per task):")
     for ttype, s in by_type.items():
@@ -20,12 +20,17 @@ JSONL format:
 from __future__ import annotations
 
 import argparse
+import csv
 import json
 import os
 import sys
-from typing import Dict, Any, List, Tuple
+import tempfile
+from collections import defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from operator import itemgetter
+from typing import BinaryIO, Deque, Dict, Any, Iterator, List, Tuple
 
-from validator import validate
+from validator import ValidationResult, specialize, validate
 
 def load_tasks(tasks_dir: str) -> List[Dict[str, Any]]:
     tasks: List[Dict[str, Any]] = []
@@ -33,22 +38,23 @@ def load_tasks(tasks_dir: str) -> List[Dict[str, Any]]:
         path = os.path.join(tasks_dir, fname)
         with open(path, "r", encoding="utf-8") as f:
             tasks.extend(json.load(f))
+    # Bind each task's validator once, not per attempt
+    for t in tasks:
+        t["_validator_fn"] = specialize(t)
     # stable ordering
-    tasks.sort(key=lambda x: x["id"])
+    tasks.sort(key=itemgetter("id"))
     return tasks
 
-def write_csv(rows: List[Dict[str, Any]], out_path: str) -> None:
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    fieldnames = ["task_id", "task_type", "attempt", "passed", "error", "detail"]
-    with open(out_path, "w", encoding="utf-8", newline="") as f:
-        import csv
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        for r in rows:
-            w.writerow(r)
-
-def manual_mode(tasks: List[Dict[str, Any]], retries: int) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
+# CSV columns; rows are written positionally in this order
+FIELDNAMES = ["task_id", "task_type", "attempt", "passed", "error", "detail"]
+Row = Tuple[str, str, int, bool, str, str]
+
+def _row(task: Dict[str, Any], attempt: int, res: ValidationResult) -> Row:
+    return (task["id"], task["type"], attempt, res.passed, res.error, res.detail or "")
+
+def manual_mode(tasks: List[Dict[str, Any]], retries: int, w: Any) -> int:
+    # Rows are written to the csv writer `w` as they are validated; returns the row count
+    n = 0
     print("Manual mode: paste model outputs exactly as returned.\n"
           "Tip: if your model adds code fences, remove them before pasting.\n", file=sys.stderr)
     for task in tasks:
@@ -61,18 +67,12 @@ def manual_mode(tasks: List[Dict[str, Any]], retries: int) -> List[Dict[str, Any
                 output = sys.stdin.read()
             except KeyboardInterrupt:
                 print("\nInterrupted.", file=sys.stderr)
-                return rows
+                return n
             # reset stdin for next prompt (works in many terminals by reopening)
             # In notebooks/redirect contexts, use from-file mode instead.
             res = validate(task, output.strip("\n"))
-            rows.append({
-                "task_id": task["id"],
-                "task_type": task["type"],
-                "attempt": attempt,
-                "passed": res.passed,
-                "error": res.error,
-                "detail": res.detail or ""
-            })
+            w.writerow(_row(task, attempt, res))
+            n += 1
             if res.passed:
                 break
             else:
@@ -84,37 +84,120 @@ def manual_mode(tasks: List[Dict[str, Any]], retries: int) -> List[Dict[str, Any
             # If /dev/tty is unavailable, advise user.
             print("\nNote: /dev/tty unavailable. If manual mode breaks, use --mode from-file.", file=sys.stderr)
             break
+    return n
+
+def _run_task_attempts(task: Dict[str, Any], outs: Dict[int, str], retries: int) -> List[Row]:
+    # Evaluate one task's attempts in order, stopping at the first PASS
+    rows: List[Row] = []
+    for attempt in sorted(a for a in outs if 1 <= a <= retries):
+        res = validate(task, outs[attempt])
+        rows.append(_row(task, attempt, res))
+        if res.passed:
+            break
     return rows
 
-def from_file_mode(tasks: List[Dict[str, Any]], retries: int, inputs_path: str) -> List[Dict[str, Any]]:
-    # Index tasks
-    task_map = {t["id"]: t for t in tasks}
-    # Read inputs
-    attempts: Dict[Tuple[str,int], str] = {}
-    with open(inputs_path, "r", encoding="utf-8") as f:
+# Per-process task index for pool workers, populated once by _init_worker
+_TASK_MAP: Dict[str, Dict[str, Any]] = {}
+
+def _init_worker(tasks: List[Dict[str, Any]]) -> None:
+    global _TASK_MAP
+    for t in tasks:
+        t["_validator_fn"] = specialize(t)
+    _TASK_MAP = {t["id"]: t for t in tasks}
+
+def _run_task_id_attempts(task_id: str, outs: Dict[int, str], retries: int) -> List[Row]:
+    return _run_task_attempts(_TASK_MAP[task_id], outs, retries)
+
+# Inputs larger than this are indexed by file offset instead of held in memory.
+# Trade-off: indexing parses every line (output included) to read task_id/attempt,
+# and each kept line is parsed again when its task is loaded, so large files pay
+# roughly twice the JSON parse cost in exchange for holding one task's outputs at a time.
+_INDEX_THRESHOLD = 64 << 20
+
+def _read_inputs(inputs_path: str) -> Dict[str, Dict[int, str]]:
+    # task_id -> {attempt: output} (later lines win)
+    attempts: Dict[str, Dict[int, str]] = defaultdict(dict)
+    with open(inputs_path, "r", encoding="utf-8", buffering=1 << 20) as f:
         for line in f:
             if not line.strip():
                 continue
             rec = json.loads(line)
-            attempts[(rec["task_id"], int(rec["attempt"]))] = rec["output"]
-    rows: List[Dict[str, Any]] = []
-    for task in tasks:
-        for attempt in range(1, retries+1):
-            out = attempts.get((task["id"], attempt))
-            if out is None:
-                continue
-            res = validate(task, out)
-            rows.append({
-                "task_id": task["id"],
-                "task_type": task["type"],
-                "attempt": attempt,
-                "passed": res.passed,
-                "error": res.error,
-                "detail": res.detail or ""
-            })
-            if res.passed:
-                break
-    return rows
+            attempts[rec["task_id"]][int(rec["attempt"])] = rec["output"]
+    return attempts
+
+def _index_inputs(f: BinaryIO, retries: int) -> Dict[str, Dict[int, int]]:
+    # task_id -> {attempt: line offset} (later lines win); outputs are not retained
+    offsets: Dict[str, Dict[int, int]] = defaultdict(dict)
+    while True:
+        off = f.tell()
+        line = f.readline()
+        if not line:
+            break
+        if not line.strip():
+            continue
+        rec = json.loads(line)
+        attempt = int(rec["attempt"])
+        if 1 <= attempt <= retries:
+            offsets[rec["task_id"]][attempt] = off
+    return offsets
+
+def _load_indexed(f: BinaryIO, offs: Dict[int, int]) -> Dict[int, str]:
+    outs: Dict[int, str] = {}
+    for attempt, off in offs.items():
+        f.seek(off)
+        outs[attempt] = json.loads(f.readline())["output"]
+    return outs
+
+def _iter_jobs(tasks: List[Dict[str, Any]], retries: int, inputs_path: str,
+               ) -> Iterator[Tuple[Dict[str, Any], Dict[int, str]]]:
+    # Yield (task, {attempt: output}) in task order for tasks that have inputs
+    if os.path.getsize(inputs_path) < _INDEX_THRESHOLD:
+        attempts = _read_inputs(inputs_path)
+        for task in tasks:
+            outs = attempts.get(task["id"])
+            if outs:
+                yield task, outs
+        return
+    # Large inputs: index offsets in one pass, then load one task's outputs at a time
+    with open(inputs_path, "rb", buffering=1 << 20) as f:
+        offsets = _index_inputs(f, retries)
+        for task in tasks:
+            offs = offsets.get(task["id"])
+            if offs:
+                yield task, _load_indexed(f, offs)
+
+def from_file_mode(tasks: List[Dict[str, Any]], retries: int, inputs_path: str, w: Any,
+                   workers: int = 1) -> int:
+    # Rows are written to the csv writer `w` in task order; returns the row count
+    jobs = _iter_jobs(tasks, retries, inputs_path)
+    n = 0
+    if workers == 1:
+        for task, outs in jobs:
+            rows = _run_task_attempts(task, outs, retries)
+            w.writerows(rows)
+            n += len(rows)
+        return n
+    # Tasks are independent; retries within a task stay sequential in one worker.
+    # Workers receive the task list once at start-up; jobs carry only the task id.
+    n_workers = workers or os.cpu_count() or 1
+    # Submit through a bounded window (Executor.map would drain `jobs` up front),
+    # so indexed inputs are only loaded a few tasks ahead of the rows being written.
+    window = n_workers * 4
+    pending: Deque[Future] = deque()
+    # Specialized validators are closures and cannot be pickled; workers rebuild them
+    plain = [{k: v for k, v in t.items() if k != "_validator_fn"} for t in tasks]
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(plain,)) as ex:
+        for task, outs in jobs:
+            pending.append(ex.submit(_run_task_id_attempts, task["id"], outs, retries))
+            if len(pending) >= window:
+                rows = pending.popleft().result()
+                w.writerows(rows)
+                n += len(rows)
+        while pending:
+            rows = pending.popleft().result()
+            w.writerows(rows)
+            n += len(rows)
+    return n
 
 def main() -> None:
     ap = argparse.ArgumentParser()
@@ -122,19 +205,40 @@ def main() -> None:
     ap.add_argument("--retries", type=int, default=3, help="Max attempts per task (bounded retry budget).")
     ap.add_argument("--mode", choices=["manual","from-file"], default="manual")
     ap.add_argument("--inputs", default=None, help="JSONL inputs file (required for from-file mode).")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Worker processes for from-file validation (0 = one per CPU).")
     ap.add_argument("--out", default="results/pilot_results.csv", help="CSV output path.")
     args = ap.parse_args()
+    if args.workers < 0:
+        ap.error("--workers must be >= 0")
 
     tasks = load_tasks(args.tasks_dir)
-    if args.mode == "from-file":
-        if not args.inputs:
-            raise SystemExit("--inputs is required for from-file mode.")
-        rows = from_file_mode(tasks, args.retries, args.inputs)
-    else:
-        rows = manual_mode(tasks, args.retries)
-
-    write_csv(rows, args.out)
-    print(f"Wrote {len(rows)} rows to {args.out}", file=sys.stderr)
+    if args.mode == "from-file" and not args.inputs:
+        raise SystemExit("--inputs is required for from-file mode.")
+
+    # Stream rows to a temp file beside --out and move it into place only on success,
+    # so a failed run (bad inputs, malformed JSONL, worker errors) keeps previous results.
+    out_dir = os.path.dirname(args.out) or "."
+    os.makedirs(out_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, prefix=".pilot_results.", suffix=".tmp")
+    try:
+        # mkstemp creates the file 0600; give it the permissions a plain open() would
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        with open(fd, "w", encoding="utf-8", newline="", buffering=1 << 20) as f:
+            w = csv.writer(f)
+            w.writerow(FIELDNAMES)
+            if args.mode == "from-file":
+                n = from_file_mode(tasks, args.retries, args.inputs, w, args.workers)
+            else:
+                n = manual_mode(tasks, args.retries, w)
+        os.replace(tmp_path, args.out)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    print(f"Wrote {n} rows to {args.out}", file=sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -10,9 +10,20 @@ from __future__ import annotations
 import json
 import re
 from dataclasses import dataclass
-from typing import Any, Dict, Tuple, Optional, List
+from functools import lru_cache
+from typing import Any, Callable, Dict, Tuple, Optional, List
 
 VOWELS = set("aeiouAEIOU")
+# Deletion table for counting vowels in C: len(x) - len(x.translate(_VOWEL_DEL))
+_VOWEL_DEL = str.maketrans("", "", "".join(VOWELS))
+
+@lru_cache(maxsize=None)
+def _compiled(pattern: str) -> re.Pattern[str]:
+    return re.compile(pattern)
+
+@lru_cache(maxsize=None)
+def _digit_re(n: int) -> re.Pattern[str]:
+    return re.compile(rf"\d{{{n}}}")
 
 @dataclass
 class ValidationResult:
@@ -28,178 +39,286 @@ def _load_json(output: str) -> Tuple[Optional[Any], Optional[ValidationResult]]:
         return None, ValidationResult(False, "INVALID_JSON", str(e))
 
 def _ensure_obj(obj: Any) -> Optional[ValidationResult]:
-    if not isinstance(obj, dict):
+    if type(obj) is not dict:
         return ValidationResult(False, "INVALID_TYPE", "Expected JSON object")
     return None
 
-def validate_baseline(task: Dict[str, Any], output: str) -> ValidationResult:
+def _digit_sum(s: str) -> int:
+    # ASCII digits: sum the byte values in C and remove the '0' offset.
+    # \d also matches other Unicode decimal digits, which int() handles.
+    if s.isascii():
+        return sum(s.encode("ascii")) - 48 * len(s)
+    return sum(map(int, s))
+
+# A specialized validator takes the raw model output; a check takes the parsed JSON object.
+Validator = Callable[[str], ValidationResult]
+Check = Callable[[Dict[str, Any]], ValidationResult]
+
+def _make_baseline(task: Dict[str, Any]) -> Validator:
     expected = task["answer"]
-    # For baseline tasks, we enforce exact match after stripping trailing newlines.
-    got = output.rstrip("\n")
-    if got == expected:
-        return ValidationResult(True, "PASS")
-    return ValidationResult(False, "WRONG_ANSWER", f"Expected {expected!r}, got {got!r}")
 
-def validate_constraint(task: Dict[str, Any], output: str) -> ValidationResult:
-    v = task["validator"]
-    kind = v["kind"]
+    def validate_output(output: str) -> ValidationResult:
+        # For baseline tasks, we enforce exact match after stripping trailing newlines.
+        got = output.rstrip("\n") if output.endswith("\n") else output
+        if got == expected:
+            return ValidationResult(True, "PASS")
+        return ValidationResult(False, "WRONG_ANSWER", f"Expected {expected!r}, got {got!r}")
+    return validate_output
 
-    # Some validators operate on raw output
-    if kind == "raw_exact_no_spaces":
+def _make_raw_exact_no_spaces(v: Dict[str, Any]) -> Validator:
+    exact = v["exact"]
+
+    def validate_output(output: str) -> ValidationResult:
         raw = output.rstrip("\n")
         if " " in raw:
             return ValidationResult(False, "HAS_SPACES")
-        if raw == v["exact"]:
+        if raw == exact:
             return ValidationResult(True, "PASS")
-        return ValidationResult(False, "MISMATCH", f"Expected exact {v['exact']!r}, got {raw!r}")
+        return ValidationResult(False, "MISMATCH", f"Expected exact {exact!r}, got {raw!r}")
+    return validate_output
 
-    # JSON-based validators
-    obj, err = _load_json(output)
-    if err:
-        return err
-    err2 = _ensure_obj(obj)
-    if err2:
-        return err2
-    assert isinstance(obj, dict)
-
-    if kind == "json_exact":
-        required_keys = set(v["required_keys"])
-        if not required_keys.issubset(obj.keys()):
-            return ValidationResult(False, "MISSING_KEYS", f"Missing: {sorted(required_keys - set(obj.keys()))}")
-        if v.get("no_extra_keys", False):
-            extra = set(obj.keys()) - required_keys
+def _make_json_exact(v: Dict[str, Any]) -> Check:
+    required_keys = frozenset(v["required_keys"])
+    no_extra_keys = v.get("no_extra_keys", False)
+    equals_items = tuple(v.get("equals", {}).items())
+
+    def check(obj: Dict[str, Any]) -> ValidationResult:
+        if not obj.keys() >= required_keys:
+            return ValidationResult(False, "MISSING_KEYS", f"Missing: {sorted(required_keys - obj.keys())}")
+        if no_extra_keys:
+            extra = obj.keys() - required_keys
             if extra:
                 return ValidationResult(False, "EXTRA_KEYS", f"Extra: {sorted(extra)}")
-        equals = v.get("equals", {})
-        for k, expected in equals.items():
+        for k, expected in equals_items:
             if obj.get(k) != expected:
                 return ValidationResult(False, "CONSTRAINT_VIOLATION", f"{k} expected {expected!r}, got {obj.get(k)!r}")
         return ValidationResult(True, "PASS")
+    return check
+
+def _make_json_words_list(v: Dict[str, Any]) -> Check:
+    key = v["key"]
+    list_len = v["list_len"]
+    word_len = v["word_len"]
 
-    if kind == "json_words_list":
-        key = v["key"]
+    def check(obj: Dict[str, Any]) -> ValidationResult:
         if key not in obj:
             return ValidationResult(False, "MISSING_KEYS", f"Missing key: {key}")
         words = obj[key]
-        if not isinstance(words, list):
+        if type(words) is not list:
             return ValidationResult(False, "INVALID_TYPE", f"{key} must be a list")
-        if len(words) != v["list_len"]:
-            return ValidationResult(False, "COUNT_MISMATCH", f"Expected {v['list_len']} words, got {len(words)}")
+        if len(words) != list_len:
+            return ValidationResult(False, "COUNT_MISMATCH", f"Expected {list_len} words, got {len(words)}")
         for w in words:
-            if not isinstance(w, str):
+            if type(w) is not str:
                 return ValidationResult(False, "INVALID_TYPE", "All words must be strings")
-            if len(w) != v["word_len"]:
-                return ValidationResult(False, "CONSTRAINT_VIOLATION", f"Word {w!r} length {len(w)} != {v['word_len']}")
+            if len(w) != word_len:
+                return ValidationResult(False, "CONSTRAINT_VIOLATION", f"Word {w!r} length {len(w)} != {word_len}")
         return ValidationResult(True, "PASS")
+    return check
 
-    if kind == "json_string_forbidden_chars":
-        key = v["key"]
+def _make_json_string_forbidden_chars(v: Dict[str, Any]) -> Check:
+    key = v["key"]
+    forbidden = list(v.get("forbidden_chars", []))
+    # Set lookups only apply to single characters; longer tokens use substring scans
+    forbid_set = frozenset(forbidden) if all(len(ch) == 1 for ch in forbidden) else None
+
+    def check(obj: Dict[str, Any]) -> ValidationResult:
         if key not in obj:
             return ValidationResult(False, "MISSING_KEYS", f"Missing key: {key}")
         s = obj[key]
-        if not isinstance(s, str):
+        if type(s) is not str:
             return ValidationResult(False, "INVALID_TYPE", f"{key} must be a string")
-        forbidden = v.get("forbidden_chars", [])
+        if forbid_set is not None:
+            hit = forbid_set.intersection(s)
+            if hit:
+                # Report the first offender in declaration order, independent of set ordering
+                ch = next(ch for ch in forbidden if ch in hit)
+                return ValidationResult(False, "FORBIDDEN_TOKEN", f"Found forbidden char {ch!r}")
+            return ValidationResult(True, "PASS")
         for ch in forbidden:
             if ch in s:
                 return ValidationResult(False, "FORBIDDEN_TOKEN", f"Found forbidden char {ch!r}")
         return ValidationResult(True, "PASS")
+    return check
+
+def _make_json_crossfield_charcount(v: Dict[str, Any]) -> Check:
+    text_key = v["text_key"]
+    count_key = v["count_key"]
 
-    if kind == "json_crossfield_charcount":
-        text_key = v["text_key"]
-        count_key = v["count_key"]
+    def check(obj: Dict[str, Any]) -> ValidationResult:
         if text_key not in obj or count_key not in obj:
             return ValidationResult(False, "MISSING_KEYS", f"Need keys: {text_key}, {count_key}")
         text = obj[text_key]
         count = obj[count_key]
-        if not isinstance(text, str) or not isinstance(count, int):
+        if type(text) is not str or type(count) is not int:
             return ValidationResult(False, "INVALID_TYPE", "text must be string; count must be int")
         true_count = len(text)
         if count != true_count:
             return ValidationResult(False, "COUNT_MISMATCH", f"count={count} but len(text)={true_count}")
         return ValidationResult(True, "PASS")
+    return check
 
-    if kind == "json_list_exact":
-        key = v["key"]
+def _make_json_list_exact(v: Dict[str, Any]) -> Check:
+    key = v["key"]
+    exact = v["exact"]
+
+    def check(obj: Dict[str, Any]) -> ValidationResult:
         if key not in obj:
             return ValidationResult(False, "MISSING_KEYS", f"Missing key: {key}")
         items = obj[key]
-        if items != v["exact"]:
-            return ValidationResult(False, "MISMATCH", f"Expected {v['exact']!r}, got {items!r}")
+        if items != exact:
+            return ValidationResult(False, "MISMATCH", f"Expected {exact!r}, got {items!r}")
         return ValidationResult(True, "PASS")
+    return check
+
+def _make_json_vowel_count(v: Dict[str, Any]) -> Check:
+    x_key = v["x_key"]
+    y_key = v["y_key"]
+    x_len = v["len"]
+    pattern = _compiled(v["regex"]) if "regex" in v else None
 
-    if kind == "json_vowel_count":
-        x_key = v["x_key"]
-        y_key = v["y_key"]
+    def check(obj: Dict[str, Any]) -> ValidationResult:
         if x_key not in obj or y_key not in obj:
             return ValidationResult(False, "MISSING_KEYS", f"Need keys: {x_key}, {y_key}")
         x = obj[x_key]
         y = obj[y_key]
-        if not isinstance(x, str) or not isinstance(y, int):
+        if type(x) is not str or type(y) is not int:
             return ValidationResult(False, "INVALID_TYPE", "x must be string; y must be int")
-        if len(x) != v["len"]:
-            return ValidationResult(False, "CONSTRAINT_VIOLATION", f"x length {len(x)} != {v['len']}")
-        if "regex" in v and not re.match(v["regex"], x):
+        if len(x) != x_len:
+            return ValidationResult(False, "CONSTRAINT_VIOLATION", f"x length {len(x)} != {x_len}")
+        if pattern is not None and not pattern.match(x):
             return ValidationResult(False, "CONSTRAINT_VIOLATION", "x fails regex")
-        true_y = sum(1 for ch in x if ch in VOWELS)
+        true_y = len(x) - len(x.translate(_VOWEL_DEL))
         if y != true_y:
             return ValidationResult(False, "COUNT_MISMATCH", f"y={y} but vowel_count(x)={true_y}")
         return ValidationResult(True, "PASS")
+    return check
 
-    if kind == "json_enum":
-        key = v["key"]
+def _make_json_enum(v: Dict[str, Any]) -> Check:
+    key = v["key"]
+    allowed_list = v["allowed"]
+    allowed = frozenset(allowed_list)
+
+    def check(obj: Dict[str, Any]) -> ValidationResult:
         if key not in obj:
             return ValidationResult(False, "MISSING_KEYS", f"Missing key: {key}")
         val = obj[key]
-        if not isinstance(val, str):
+        if type(val) is not str:
             return ValidationResult(False, "INVALID_TYPE", f"{key} must be a string")
-        if val not in v["allowed"]:
-            return ValidationResult(False, "CONSTRAINT_VIOLATION", f"{val!r} not in allowed {v['allowed']}")
+        if val not in allowed:
+            return ValidationResult(False, "CONSTRAINT_VIOLATION", f"{val!r} not in allowed {allowed_list}")
         # Optional: prevent extra keys if only one key intended
         if len(obj.keys()) != 1:
             return ValidationResult(False, "EXTRA_KEYS", "Only 'color' key is allowed")
         return ValidationResult(True, "PASS")
+    return check
+
+def _make_json_digit_sum(v: Dict[str, Any]) -> Check:
+    id_key = v["id_key"]
+    sum_key = v["sum_key"]
+    digits = v["digits"]
+    digit_re = _digit_re(digits)
 
-    if kind == "json_digit_sum":
-        id_key = v["id_key"]
-        sum_key = v["sum_key"]
+    def check(obj: Dict[str, Any]) -> ValidationResult:
         if id_key not in obj or sum_key not in obj:
             return ValidationResult(False, "MISSING_KEYS", f"Need keys: {id_key}, {sum_key}")
         s = obj[id_key]
         total = obj[sum_key]
-        if not isinstance(s, str) or not isinstance(total, int):
+        if type(s) is not str or type(total) is not int:
             return ValidationResult(False, "INVALID_TYPE", "id must be string; sum must be int")
-        if not re.fullmatch(r"\d{" + str(v["digits"]) + r"}", s):
-            return ValidationResult(False, "CONSTRAINT_VIOLATION", f"id must be exactly {v['digits']} digits")
-        true_total = sum(int(ch) for ch in s)
+        if not digit_re.fullmatch(s):
+            return ValidationResult(False, "CONSTRAINT_VIOLATION", f"id must be exactly {digits} digits")
+        true_total = _digit_sum(s)
         if total != true_total:
             return ValidationResult(False, "COUNT_MISMATCH", f"sum={total} but digit_sum(id)={true_total}")
         return ValidationResult(True, "PASS")
+    return check
+
+def _make_json_unique_letters(v: Dict[str, Any]) -> Check:
+    letters_key = v["letters_key"]
+    unique_key = v["unique_key"]
+    letters_len = v["len"]
+    pattern = _compiled(v["regex"]) if "regex" in v else None
 
-    if kind == "json_unique_letters":
-        letters_key = v["letters_key"]
-        unique_key = v["unique_key"]
+    def check(obj: Dict[str, Any]) -> ValidationResult:
         if letters_key not in obj or unique_key not in obj:
             return ValidationResult(False, "MISSING_KEYS", f"Need keys: {letters_key}, {unique_key}")
         letters = obj[letters_key]
         unique = obj[unique_key]
-        if not isinstance(letters, str) or not isinstance(unique, bool):
+        if type(letters) is not str or type(unique) is not bool:
             return ValidationResult(False, "INVALID_TYPE", "letters must be string; unique must be boolean")
-        if len(letters) != v["len"]:
-            return ValidationResult(False, "CONSTRAINT_VIOLATION", f"letters length {len(letters)} != {v['len']}")
-        if "regex" in v and not re.match(v["regex"], letters):
+        if len(letters) != letters_len:
+            return ValidationResult(False, "CONSTRAINT_VIOLATION", f"letters length {len(letters)} != {letters_len}")
+        if pattern is not None and not pattern.match(letters):
             return ValidationResult(False, "CONSTRAINT_VIOLATION", "letters fails regex")
         true_unique = len(set(letters)) == len(letters)
         if unique != true_unique:
             return ValidationResult(False, "INCONSISTENT_FIELDS", f"unique={unique} but all_unique={true_unique}")
         return ValidationResult(True, "PASS")
+    return check
 
-    return ValidationResult(False, "UNKNOWN_VALIDATOR", f"Unknown kind: {kind}")
+def _make_unknown(v: Dict[str, Any]) -> Check:
+    kind = v["kind"]
 
-def validate(task: Dict[str, Any], output: str) -> ValidationResult:
+    def check(obj: Dict[str, Any]) -> ValidationResult:
+        return ValidationResult(False, "UNKNOWN_VALIDATOR", f"Unknown kind: {kind}")
+    return check
+
+# Builders for validators that parse the output as a JSON object, keyed by validator kind.
+_FACTORIES: Dict[str, Callable[[Dict[str, Any]], Check]] = {
+    "json_exact": _make_json_exact,
+    "json_words_list": _make_json_words_list,
+    "json_string_forbidden_chars": _make_json_string_forbidden_chars,
+    "json_crossfield_charcount": _make_json_crossfield_charcount,
+    "json_list_exact": _make_json_list_exact,
+    "json_vowel_count": _make_json_vowel_count,
+    "json_enum": _make_json_enum,
+    "json_digit_sum": _make_json_digit_sum,
+    "json_unique_letters": _make_json_unique_letters,
+}
+
+def _make_constraint(v: Dict[str, Any]) -> Validator:
+    kind = v["kind"]
+
+    # Some validators operate on raw output
+    if kind == "raw_exact_no_spaces":
+        return _make_raw_exact_no_spaces(v)
+
+    check = _FACTORIES.get(kind, _make_unknown)(v)
+
+    # JSON-based validators
+    def validate_output(output: str) -> ValidationResult:
+        obj, err = _load_json(output)
+        if err:
+            return err
+        err2 = _ensure_obj(obj)
+        if err2:
+            return err2
+        assert type(obj) is dict
+        return check(obj)
+    return validate_output
+
+def specialize(task: Dict[str, Any]) -> Validator:
+    """Build a validator for one task with its spec values bound in.
+
+    The result depends only on the task definition, so it can be built once at
+    load time and reused for every attempt (see run_pilot.load_tasks). It captures
+    the task's values when built; rebuild it if the task is edited afterwards.
+    """
     t = task.get("type")
     if t == "baseline":
-        return validate_baseline(task, output)
+        return _make_baseline(task)
     if t == "constraint":
-        return validate_constraint(task, output)
-    return ValidationResult(False, "UNKNOWN_TASK_TYPE", f"Unknown task type: {t}")
+        return _make_constraint(task["validator"])
+
+    def validate_output(output: str) -> ValidationResult:
+        return ValidationResult(False, "UNKNOWN_TASK_TYPE", f"Unknown task type: {t}")
+    return validate_output
+
+def validate(task: Dict[str, Any], output: str) -> ValidationResult:
+    # Use the validator attached by run_pilot.load_tasks when present; otherwise build
+    # one for this call without storing it on the caller's task dict.
+    fn = task.get("_validator_fn")
+    if fn is None:
+        return specialize(task)(output)
+    return fn(output)